@@ -65,6 +65,27 @@ else
         --region $REGION
 fi
 
+# Schedule warmup pings so a container stays initialised
+echo "⏰ Setting up warmup schedule..."
+RULE_ARN=$(aws events put-rule \
+    --name "$FUNCTION_NAME-warmup" \
+    --schedule-expression "rate(5 minutes)" \
+    --region $REGION \
+    --query 'RuleArn' --output text)
+
+aws lambda add-permission \
+    --function-name $FUNCTION_NAME \
+    --statement-id "eventbridge-warmup" \
+    --action "lambda:InvokeFunction" \
+    --principal "events.amazonaws.com" \
+    --source-arn "$RULE_ARN" \
+    --region $REGION >/dev/null 2>&1 || echo "Permission already exists"
+
+aws events put-targets \
+    --rule "$FUNCTION_NAME-warmup" \
+    --targets "Id"="1","Arn"="arn:aws:lambda:$REGION:$(aws sts get-caller-identity --query Account --output text):function:$FUNCTION_NAME" \
+    --region $REGION >/dev/null
+
 # Create API Gateway if it doesn't exist
 echo "🌐 Setting up API Gateway..."
 
@@ -1,26 +1,125 @@
 import json
+import base64
+import binascii
 import requests
 import time
 import random
 import os
+import sys
 from typing import List, Dict, Optional, Tuple
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
+
+try:
+    # Only present on Lambda runtimes with SnapStart support
+    from snapshot_restore_py import register_after_restore
+except ImportError:
+    register_after_restore = None
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Headers that must not be copied between the gateway and upstream services
+_HOP_BY_HOP = frozenset(map(sys.intern, ('host', 'connection', 'content-length', 'transfer-encoding')))
+
+# Headers shared by every JSON error response
+_ERROR_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+# Content-Type prefixes returned to API Gateway as base64-encoded bodies
+_BINARY_CT = ('application/pdf', 'image/', 'video/', 'audio/', 'application/octet-stream')
+
+# Default seconds to wait for a TCP/TLS connection before failing over;
+# the per-service 'timeout' only bounds the (long) read of the response
+_CONNECT_TIMEOUT = 5
+
+# Full-jitter exponential backoff between retries across services
+_RETRY_BASE_DELAY = 0.05
+_RETRY_MAX_DELAY = 1.0
+
+# Read size for streamed upstream bodies (a multiple of 3 keeps base64 chunks aligned)
+_STREAM_CHUNK_SIZE = 65535
+
+# Shared HTTP session so warm invocations reuse pooled keep-alive connections.
+# Only connection errors are retried; the request never reached the service.
+_SESSION = requests.Session()
+_SESSION.headers.update({'Connection': 'keep-alive'})
+for _scheme in ('http://', 'https://'):
+    _SESSION.mount(_scheme, HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=32,
+        max_retries=Retry(total=1, connect=1, read=0, status=0, backoff_factor=0.1)
+    ))
+
+# Session methods keyed by HTTP method for request forwarding
+_METHOD_DISPATCH = {
+    'GET': _SESSION.get,
+    'POST': _SESSION.post,
+    'PUT': _SESSION.put,
+    'DELETE': _SESSION.delete
+}
+
+# Worker pool for running health checks concurrently
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+def _after_restore():
+    """Reset per-process state captured in a SnapStart snapshot"""
+    # Pooled sockets and TLS sessions from the snapshot are not valid after restore
+    _SESSION.close()
+    # Every restored container would otherwise share the same random sequence
+    random.seed()
+
+if register_after_restore is not None:
+    register_after_restore(_after_restore)
+
+class CircuitState:
+    """Circuit breaker state for a single service"""
+    __slots__ = ('failures', 'last_failure', 'status')
+    
+    def __init__(self, failures: int = 0, last_failure: float = 0.0, status: str = 'closed'):
+        self.failures = failures
+        self.last_failure = last_failure
+        self.status = status
+
 class ServiceManager:
     def __init__(self, config: Dict):
         self.config = config
-        self.services = config.get('ai_services', [])
-        self.circuit_breakers = {}
+        # Services never change at runtime, so sort by priority (lower number = higher priority) once
+        self.services = sorted(config.get('ai_services', []), key=lambda s: s.get('priority', 999))
+        # Intern names used as circuit breaker keys and precompute URLs so the
+        # request path only concatenates strings
+        for service in self.services:
+            service['name'] = sys.intern(service['name'])
+            service['_url_base'] = service['url'].rstrip('/')
+            service['_health_url'] = service['_url_base'] + service.get('health_check_path', '/health')
+        self.circuit_breakers: Dict[str, CircuitState] = {}
         self.last_health_check = {}
+        # Circuit breaker settings are read once rather than on every check
+        cb_config = config.get('circuit_breaker', {})
+        self._cb_threshold = cb_config.get('failure_threshold', 5)
+        self._cb_recovery = cb_config.get('recovery_timeout', 60)
         
-    def get_available_services(self) -> List[Dict]:
+    def get_available_services(self, current_time: Optional[float] = None) -> List[Dict]:
         """Get list of enabled and available services sorted by priority"""
         available = []
-        current_time = time.time()
+        if current_time is None:
+            current_time = time.monotonic()
         
         for service in self.services:
             if not service.get('enabled', True):
@@ -30,50 +129,52 @@ class ServiceManager:
             
             # Check circuit breaker status
             if self._is_circuit_breaker_open(service_name, current_time):
-                logger.warning(f"Service {service_name} circuit breaker is open")
+                logger.warning("Service %s circuit breaker is open", service_name)
                 continue
                 
             available.append(service)
         
-        # Sort by priority (lower number = higher priority)
-        return sorted(available, key=lambda x: x.get('priority', 999))
+        # self.services is already in priority order
+        return available
     
     def _is_circuit_breaker_open(self, service_name: str, current_time: float) -> bool:
         """Check if circuit breaker is open for a service"""
-        cb_config = self.config.get('circuit_breaker', {})
-        failure_threshold = cb_config.get('failure_threshold', 5)
-        recovery_timeout = cb_config.get('recovery_timeout', 60)
+        cb_state = self.circuit_breakers.get(service_name)
         
-        cb_state = self.circuit_breakers.get(service_name, {'failures': 0, 'last_failure': 0})
+        # Fast path: services that never failed or are below the threshold
+        if not cb_state or cb_state.failures < self._cb_threshold:
+            return False
         
-        if cb_state['failures'] >= failure_threshold:
-            if current_time - cb_state['last_failure'] < recovery_timeout:
-                return True
-            else:
-                # Reset circuit breaker after recovery timeout
-                self.circuit_breakers[service_name] = {'failures': 0, 'last_failure': 0}
+        if current_time - cb_state.last_failure < self._cb_recovery:
+            return True
         
+        # Reset circuit breaker after recovery timeout
+        cb_state.failures = 0
+        cb_state.last_failure = 0.0
         return False
     
-    def record_failure(self, service_name: str):
+    def record_failure(self, service_name: str, current_time: Optional[float] = None):
         """Record a failure for circuit breaker tracking"""
-        current_time = time.time()
-        if service_name not in self.circuit_breakers:
-            self.circuit_breakers[service_name] = {'failures': 0, 'last_failure': 0}
+        if current_time is None:
+            current_time = time.monotonic()
+        cb_state = self.circuit_breakers.get(service_name)
+        if cb_state is None:
+            cb_state = self.circuit_breakers[service_name] = CircuitState()
         
-        self.circuit_breakers[service_name]['failures'] += 1
-        self.circuit_breakers[service_name]['last_failure'] = current_time
+        cb_state.failures += 1
+        cb_state.last_failure = current_time
         
-        logger.warning(f"Recorded failure for {service_name}. Total failures: {self.circuit_breakers[service_name]['failures']}")
+        logger.warning("Recorded failure for %s. Total failures: %s", service_name, cb_state.failures)
     
     def record_success(self, service_name: str):
         """Record a success and reset circuit breaker if needed"""
-        if service_name in self.circuit_breakers:
-            self.circuit_breakers[service_name]['failures'] = 0
-        logger.info(f"Recorded success for {service_name}")
+        cb_state = self.circuit_breakers.get(service_name)
+        if cb_state is not None:
+            cb_state.failures = 0
+        logger.info("Recorded success for %s", service_name)
 
-def load_config() -> Dict:
-    """Load configuration from config.json"""
+def _find_and_load_config() -> Tuple[Optional[str], Dict]:
+    """Locate and load config.json, returning the path used and the configuration"""
     # Prefer layer path /opt, then local dir, then package path
     candidate_paths = [
         os.environ.get('ROUTER_CONFIG_PATH'),
@@ -84,18 +185,18 @@ def load_config() -> Dict:
         if not path:
             continue
         try:
-            with open(path, 'r') as f:
-                cfg = json.load(f)
-                logger.info(f"Loaded config from {path}")
-                return cfg
+            with open(path, 'rb') as f:
+                cfg = _loads(f.read())
+                logger.info("Loaded config from %s", path)
+                return path, cfg
         except FileNotFoundError:
             continue
         except Exception as e:
-            logger.error(f"Failed to load config from {path}: {e}")
+            logger.error("Failed to load config from %s: %s", path, e)
             continue
     # Fallback configuration
     logger.warning("Config file not found, using fallback configuration")
-    return {
+    return None, {
         "ai_services": [
             {
                 "name": "ngrok-local",
@@ -109,71 +210,102 @@ def load_config() -> Dict:
         "max_retries": 3
     }
 
+def load_config() -> Dict:
+    """Load configuration from config.json"""
+    return _find_and_load_config()[1]
+
+# Resolve and load configuration once per container; warm invocations reuse
+# the same ServiceManager so circuit breaker state survives between requests.
+_CONFIG_PATH, _CONFIG = _find_and_load_config()
+_SERVICE_MANAGER = ServiceManager(_CONFIG)
+
 def health_check_service(service: Dict) -> bool:
     """Check if a service is healthy"""
     try:
-        response = requests.get(
-            f"{service['url']}/health",
+        response = _SESSION.get(
+            service['_health_url'],
             timeout=5
         )
         return response.status_code == 200
     except Exception as e:
-        logger.error(f"Health check failed for {service['name']}: {str(e)}")
+        logger.error("Health check failed for %s: %s", service['name'], e)
         return False
 
-def forward_request(service: Dict, path: str, method: str, headers: Dict, data: bytes = None, files: Dict = None) -> Tuple[int, Dict, bytes]:
+def _read_body(response: requests.Response) -> Tuple[bytes, bool]:
+    """Read a streamed response body, base64-encoding binary content chunk by chunk.
+    
+    Returns the body and whether it is base64 encoded. Encoding as chunks
+    arrive avoids holding the raw bytes and their base64 copy at the same time.
+    """
+    content_type = (response.headers.get('Content-Type') or '').lower()
+    if not content_type.startswith(_BINARY_CT):
+        return response.content, False
+    
+    encoded = bytearray()
+    pending = b''
+    for chunk in response.iter_content(chunk_size=_STREAM_CHUNK_SIZE):
+        if pending:
+            chunk = pending + chunk
+        # Only encode whole 3-byte groups so no padding lands mid-body
+        cut = len(chunk) - len(chunk) % 3
+        encoded += binascii.b2a_base64(memoryview(chunk)[:cut], newline=False)
+        pending = chunk[cut:]
+    if pending:
+        encoded += binascii.b2a_base64(pending, newline=False)
+    return encoded, True
+
+def forward_request(service: Dict, path: str, method: str, headers: Dict, data: bytes = None, files: Dict = None,
+                    params: Optional[Dict] = None) -> Tuple[int, Dict, bytes, bool]:
     """Forward request to a specific service"""
     try:
-        url = f"{service['url']}{path}"
-        timeout = service.get('timeout', 300)
+        url = service['_url_base'] + path
+        timeout = (service.get('connect_timeout', _CONNECT_TIMEOUT), service.get('timeout', 300))
         
         # Prepare headers (exclude hop-by-hop headers)
-        forwarded_headers = {}
-        for key, value in headers.items():
-            if key.lower() not in ['host', 'connection', 'content-length']:
-                forwarded_headers[key] = value
+        forwarded_headers = {k: v for k, v in headers.items() if k.lower() not in _HOP_BY_HOP}
         
-        logger.info(f"Forwarding {method} request to {service['name']}: {url}")
+        logger.info("Forwarding %s request to %s: %s", method, service['name'], url)
         
-        if method == 'GET':
-            response = requests.get(url, headers=forwarded_headers, timeout=timeout)
-        elif method == 'POST':
-            if files:
-                response = requests.post(url, headers=forwarded_headers, files=files, timeout=timeout)
-            else:
-                response = requests.post(url, headers=forwarded_headers, data=data, timeout=timeout)
-        elif method == 'PUT':
-            response = requests.put(url, headers=forwarded_headers, data=data, timeout=timeout)
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=forwarded_headers, timeout=timeout)
+        send = _METHOD_DISPATCH.get(method.upper())
+        if send is None:
+            return 405, {}, b'Method not allowed', False
+        if files:
+            response = send(url, headers=forwarded_headers, files=files, params=params, timeout=timeout, stream=True)
         else:
-            return 405, {}, b'Method not allowed'
-        
-        # Extract response headers
-        response_headers = {}
-        for key, value in response.headers.items():
-            if key.lower() not in ['connection', 'transfer-encoding']:
-                response_headers[key] = value
+            response = send(url, headers=forwarded_headers, data=data, params=params, timeout=timeout, stream=True)
         
-        logger.info(f"Service {service['name']} responded with status {response.status_code}")
-        return response.status_code, response_headers, response.content
+        with response:
+            # Extract response headers
+            response_headers = {k: v for k, v in response.headers.items() if k.lower() not in _HOP_BY_HOP}
+            
+            logger.info("Service %s responded with status %s", service['name'], response.status_code)
+            response_body, is_base64_encoded = _read_body(response)
+            return response.status_code, response_headers, response_body, is_base64_encoded
         
     except requests.exceptions.Timeout:
-        logger.error(f"Timeout when forwarding request to {service['name']}")
-        return 504, {}, b'Gateway timeout'
+        logger.error("Timeout when forwarding request to %s", service['name'])
+        return 504, {}, b'Gateway timeout', False
     except requests.exceptions.ConnectionError:
-        logger.error(f"Connection error when forwarding request to {service['name']}")
-        return 503, {}, b'Service unavailable'
+        logger.error("Connection error when forwarding request to %s", service['name'])
+        return 503, {}, b'Service unavailable', False
     except Exception as e:
-        logger.error(f"Error forwarding request to {service['name']}: {str(e)}")
-        return 500, {}, b'Internal server error'
+        logger.error("Error forwarding request to %s: %s", service['name'], e)
+        return 500, {}, b'Internal server error', False
 
 def lambda_handler(event, context):
     """Main Lambda handler function"""
+    global _SERVICE_MANAGER
+    # Scheduled warmup pings only need the container initialised
+    if event.get('source') == 'aws.events' or event.get('warmup'):
+        return {'statusCode': 200, 'body': 'pong'}
+    
+    # Single monotonic reading for circuit breaker checks in this invocation
+    now = time.monotonic()
     try:
-        # Load configuration
-        config = load_config()
-        service_manager = ServiceManager(config)
+        # Reuse the container-level service manager, initialising lazily if needed
+        if _SERVICE_MANAGER is None:
+            _SERVICE_MANAGER = ServiceManager(_CONFIG)
+        service_manager = _SERVICE_MANAGER
         
         # Extract request information
         http_method = event.get('httpMethod', 'GET')
@@ -186,45 +318,62 @@ def lambda_handler(event, context):
         files = None
         if event.get('body'):
             if event.get('isBase64Encoded'):
-                import base64
                 body = base64.b64decode(event['body'])
             else:
+                # Encode once here: requests measures a str body by encoding it and
+                # urllib3 encodes it again to send (urllib3 1.x even uses latin-1)
                 body = event['body'].encode('utf-8')
         
-        logger.info(f"Received {http_method} request for path: {path}")
+        logger.info("Received %s request for path: %s", http_method, path)
         
         # Get available services
-        available_services = service_manager.get_available_services()
+        available_services = service_manager.get_available_services(now)
         
         if not available_services:
             logger.error("No available services found")
             return {
                 'statusCode': 503,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
+                'headers': _ERROR_HEADERS,
+                'body': _dumps({
                     'error': 'Service not reachable at this moment',
                     'message': 'All AI services are currently unavailable. Please try again later.',
                     'timestamp': time.time()
                 })
             }
         
+        # Health check critical endpoints concurrently; results are still
+        # consumed in priority order below
+        health_checks = {}
+        if path in ['/upload', '/download']:
+            health_checks = {
+                service['name']: _EXECUTOR.submit(health_check_service, service)
+                for service in available_services
+            }
+        
         # Try each service in priority order
         last_error = None
+        attempt = 0
         for service in available_services:
-            logger.info(f"Trying service: {service['name']} ({service['url']})")
+            logger.info("Trying service: %s (%s)", service['name'], service['url'])
             
             # Perform health check for critical endpoints
-            if path in ['/upload', '/download'] and not health_check_service(service):
-                logger.warning(f"Health check failed for {service['name']}, skipping")
-                service_manager.record_failure(service['name'])
+            if service['name'] in health_checks and not health_checks[service['name']].result():
+                logger.warning("Health check failed for %s, skipping", service['name'])
+                service_manager.record_failure(service['name'], now)
                 continue
             
+            # Back off before retrying so a struggling fleet is not stampeded
+            if attempt:
+                delay = random.uniform(0, min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * 2 ** attempt))
+                if context is not None and context.get_remaining_time_in_millis() < (delay + _CONNECT_TIMEOUT) * 1000:
+                    logger.warning("Not enough time left to retry with %s", service['name'])
+                    break
+                time.sleep(delay)
+            attempt += 1
+            
             # Forward the request
-            status_code, response_headers, response_body = forward_request(
-                service, path, http_method, headers, body, files
+            status_code, response_headers, response_body, is_base64_encoded = forward_request(
+                service, path, http_method, headers, body, files, query_params
             )
             
             # Check if request was successful
@@ -234,18 +383,17 @@ def lambda_handler(event, context):
                 # Prepare Lambda response
                 response = {
                     'statusCode': status_code,
-                    'headers': response_headers,
-                    'body': response_body.decode('utf-8') if response_body else ''
+                    'headers': response_headers
                 }
                 
-                # Handle binary responses
-                if any(content_type in response_headers.get('content-type', '').lower() 
-                       for content_type in ['application/pdf', 'image/', 'video/', 'audio/']):
-                    import base64
-                    response['body'] = base64.b64encode(response_body).decode('utf-8')
+                # Binary responses arrive already base64 encoded, text is decoded as-is
+                if is_base64_encoded:
+                    response['body'] = response_body.decode('ascii')
                     response['isBase64Encoded'] = True
+                else:
+                    response['body'] = response_body.decode('utf-8') if response_body else ''
                 
-                logger.info(f"Successfully processed request via {service['name']}")
+                logger.info("Successfully processed request via %s", service['name'])
                 return response
             
             else:
@@ -259,11 +407,8 @@ def lambda_handler(event, context):
         logger.error("All services failed to process the request")
         return {
             'statusCode': 503,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
+            'headers': _ERROR_HEADERS,
+            'body': _dumps({
                 'error': 'Service not reachable at this moment',
                 'message': 'All AI services failed to process the request. Please try again later.',
                 'last_error': last_error,
@@ -272,14 +417,11 @@ def lambda_handler(event, context):
         }
         
     except Exception as e:
-        logger.error(f"Lambda handler error: {str(e)}")
+        logger.error("Lambda handler error: %s", e)
         return {
             'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
+            'headers': _ERROR_HEADERS,
+            'body': _dumps({
                 'error': 'Internal server error',
                 'message': str(e),
                 'timestamp': time.time()